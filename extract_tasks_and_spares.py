@@ -1,86 +1,324 @@
 #!/usr/bin/env python
 import argparse
+import os
 import re
-from copy import copy
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from operator import attrgetter
 from pathlib import Path
 from typing import List, Dict, Tuple
 
-from openpyxl import Workbook
-import PyPDF2
+import xlsxwriter
+import fitz  # PyMuPDF
+
+
+# ----------------------------------------------------------------------
+# Compiled patterns (hot paths run once per line/token; compiling at
+# module load skips the re-cache lookup on every call)
+# ----------------------------------------------------------------------
+_RE_PART_OR_COMPONENT = re.compile(
+    r"(?P<part>\d{5,}-\d{3,}\b)|(?P<component>\(\d{6,}-\d{4,}:)"
+)
+_RE_STATUS = re.compile(r"[\*\d]")
+_RE_LEADING_STAR = re.compile(r"^\*")
+# Both missing-space repairs in one alternation so a task row is
+# scanned once instead of twice; _fix_missing_space picks the branch.
+_RE_MISSING_SPACE = re.compile(
+    r"(?i)(?<!\s)(?P<ni>no\s+interval)"
+    r"|(?P<pre>[0-9]/[0-9]{3,})(?P<post>\d+\.\d+.*-\d+)"
+)
+
+
+def _fix_missing_space(m: "re.Match[str]") -> str:
+    ni = m.group("ni")
+    if ni is not None:
+        return " " + ni
+    return m.group("pre") + " " + m.group("post")
+
+
+_RE_NUMERIC_DOCREF = re.compile(r"\d+(?:\.\d+)*-\d+")
+
+# startswith with a tuple does all prefix comparisons in a single C call.
+_META_PREFIXES = ("database:", "printed by", "page ")
 
 
 # ----------------------------------------------------------------------
 # PDF → lines (no OCR, pure text)
 # ----------------------------------------------------------------------
+# Blocks starting within this distance (pt) of the bottom edge are page
+# footers and are dropped wholesale.
+FOOTER_MARGIN = 36.0
+
+
+def _extract_page_range(args: Tuple[str, int, int]) -> List[str]:
+    """
+    Worker: extract and filter lines for pages [lo, hi) of the PDF.
+
+    Each worker reopens the document because fitz Document objects are
+    not picklable across processes.
+    """
+    pdf_path, lo, hi = args
+    doc = fitz.open(pdf_path)
+    page_lines: List[str] = []
+
+    try:
+        for page_no in range(lo, hi):
+            page = doc[page_no]
+            footer_top = page.rect.height - FOOTER_MARGIN
+
+            # sort=True keeps top-to-bottom reading order, which the
+            # downstream line heuristics assume. Blocks carry their
+            # coordinates, so page footers ('Database:', 'Printed by',
+            # page numbers) are dropped by y-position instead of
+            # substring-matching every line.
+            for x0, y0, x1, y1, text, _block_no, block_type in page.get_text(
+                "blocks", sort=True
+            ):
+                if block_type != 0:  # image block
+                    continue
+                if y0 >= footer_top:
+                    continue
+
+                for raw_ln in text.splitlines():
+                    ln = raw_ln.rstrip()
+                    if ln.strip():
+                        page_lines.append(ln)
+    finally:
+        doc.close()
+
+    return page_lines
+
+
 def pdf_to_text_lines(pdf_path: Path) -> List[str]:
     """
-    Read the PDF with PyPDF2 and return a flat list of non-empty text lines.
+    Read the PDF with PyMuPDF and return a flat list of non-empty text lines.
     Page footers like 'Database:' or 'Printed by' are filtered out.
+
+    Pages are split into ranges and extracted in parallel across a
+    process pool; results are reassembled in submission order so the
+    flat line list matches document order.
     """
-    reader = PyPDF2.PdfReader(str(pdf_path))
-    all_lines: List[str] = []
+    doc = fitz.open(str(pdf_path))
+    page_count = doc.page_count
+    doc.close()
 
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        if not text.strip():
-            continue
+    if page_count == 0:
+        return []
 
-        for raw_ln in text.splitlines():
-            ln = raw_ln.rstrip()
-            if not ln.strip():
-                continue
+    workers = min(os.cpu_count() or 1, page_count)
+    if workers <= 1:
+        return _extract_page_range((str(pdf_path), 0, page_count))
 
-            low = ln.lower().strip()
-            if low.startswith("database:") or low.startswith("printed by"):
-                continue
+    # Contiguous page ranges, one per worker.
+    chunk = -(-page_count // workers)  # ceil division
+    ranges = [
+        (str(pdf_path), lo, min(lo + chunk, page_count))
+        for lo in range(0, page_count, chunk)
+    ]
 
-            all_lines.append(ln)
+    all_lines: List[str] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for lines in executor.map(_extract_page_range, ranges):
+            all_lines.extend(lines)
 
     return all_lines
 
 
+# Column layouts for the two sheets. Tuples so the keys are shared,
+# module-wide constants.
+TASK_HEADERS = (
+    "Sort",
+    "TaskCode",
+    "TaskAction",
+    "TaskDescription",
+    "TypeOfWork",
+    "MotionType",
+    "Duration",
+    "DurationCalc",
+    "DurationUOM",
+    "Interval",
+    "MTBMPredicted",
+    "CostCode",
+    "IncludeInME",
+    "TaskDependency",
+    "FollowUpTasks",
+    "LocationDependency",
+    "Active",
+    "Trade",
+    "Section",
+    "DocRef",
+    "Location1",
+    "Location2",
+    "ComponentPath",
+    "AssetType",
+    "AssetTypeCode",
+)
+
+SPARE_HEADERS = (
+    "TaskCode",
+    "PartNo",
+    "PartDescription",
+    "MU_TL",
+    "QtyRequired",
+    "UOM",
+    "ItemDependency",
+    "Location1",
+    "Location2",
+    "AssetType",
+    "AssetTypeCode",
+)
+
+
+@dataclass(slots=True)
+class TaskRow:
+    """
+    One row of the Tasks sheet. Field order matches TASK_HEADERS minus
+    the Sort column, which the writer derives from the row position;
+    setTypeCode is carried for spare-row fallback but never written.
+    """
+    TaskCode: str = ""
+    TaskAction: str = ""
+    TaskDescription: str = ""
+    TypeOfWork: str = ""
+    MotionType: str = ""
+    Duration: str = ""
+    DurationCalc: str = ""
+    DurationUOM: str = ""
+    Interval: str = ""
+    MTBMPredicted: str = ""
+    CostCode: str = ""
+    IncludeInME: str = ""
+    TaskDependency: str = ""
+    FollowUpTasks: str = ""
+    LocationDependency: str = ""
+    Active: str = "Y"
+    Trade: str = ""
+    Section: str = ""
+    DocRef: str = ""
+    Location1: str = ""
+    Location2: str = ""
+    ComponentPath: str = ""
+    AssetType: str = ""
+    AssetTypeCode: str = ""
+    setTypeCode: str = ""
+
+
+@dataclass(slots=True)
+class SpareRow:
+    """
+    One row of the SpareParts sheet. Field order matches SPARE_HEADERS.
+    """
+    TaskCode: str = ""
+    PartNo: str = ""
+    PartDescription: str = ""
+    MU_TL: str = ""
+    QtyRequired: str = ""
+    UOM: str = ""
+    ItemDependency: str = ""
+    Location1: str = ""
+    Location2: str = ""
+    AssetType: str = ""
+    AssetTypeCode: str = ""
+
+
+# C-level field extractors: one attrgetter call yields a row's values as
+# a tuple in sheet-column order. Sort (first task column) is positional
+# and supplied by the writer, not stored on the row.
+_TASK_FIELDS = attrgetter(*TASK_HEADERS[1:])
+_SPARE_FIELDS = attrgetter(*SPARE_HEADERS)
+
+
 # ----------------------------------------------------------------------
-# Helpers & heuristics
+# Line classification
 # ----------------------------------------------------------------------
-def is_header_line(line: str) -> bool:
-    """
-    Detect the main Task header line:
-    'Task Code Trade Task Action Task Description Doc Ref Interval'
-    """
-    lower = " ".join(line.lower().split())
-    return "task code" in lower and "task action" in lower
+class LineKind(IntEnum):
+    OTHER = 0
+    ASSET = 1
+    HEADER = 2
+    SPARES_HEADER = 3
+    METADATA = 4
+    COMPONENT = 5
+    TASK = 6
+    PART = 7
 
 
-def is_spares_header_line(line: str) -> bool:
-    """
-    Detect the Spare parts header:
-    'Part No Part Description Task Code Task Action Component Tree Path Qty Required Unit Of Measure'
+def classify(line: str) -> LineKind:
     """
-    lower = " ".join(line.lower().split())
-    squashed = lower.replace(" ", "")
+    Classify a line in one pass instead of running every predicate on it.
 
-    has_part_no = ("part no" in lower) or ("partno" in squashed)
-    has_part_desc = ("part description" in lower) or ("partdescription" in squashed)
-    has_task_code = ("task code" in lower) or ("taskcode" in squashed)
-    has_task_action = ("task action" in lower) or ("taskaction" in squashed)
-    has_qty_required = ("qty required" in lower) or ("qtyrequired" in squashed)
+    Lowercase/strip happen once; cheap prefix and substring tests run
+    before any regex. The branch order mirrors the priority the scan
+    loop used when it called the predicates one by one.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return LineKind.OTHER
+
+    first = stripped[0]
+    if first.isdigit() or first in "*([":
+        # Data rows (task/part/component) all start with a digit, '*',
+        # '(' or '['; the textual asset, header and metadata lines start
+        # with a letter, so this branch skips their prefix checks and
+        # the lowercase copy entirely.
+        #
+        # Spare-part rows start with a part number like '1036615-0000'
+        # and must be recognized before component rows. One alternation
+        # match classifies both anchored forms in a single regex pass.
+        m = _RE_PART_OR_COMPONENT.match(stripped)
+        if m:
+            return LineKind.PART if m.lastgroup == "part" else LineKind.COMPONENT
+        if first in "([" or "\\" in line or "[" in line:
+            return LineKind.COMPONENT
+    else:
+        low = stripped.lower()
 
-    return has_part_no and has_part_desc and has_task_code and has_task_action and has_qty_required
+        if low.startswith("asset:"):
+            return LineKind.ASSET
+        if low.startswith("spares asset:"):
+            # Skipped like metadata by the scan loop.
+            return LineKind.METADATA
+
+        # Header checks reuse the lowercase computed above; both header
+        # kinds contain 'task', so most lines skip them on one substring
+        # test. The space-squashed form covers spaced, squashed and
+        # irregularly spaced header spellings alike.
+        if "task" in low:
+            squashed = low.replace(" ", "")
+            if (
+                "qtyrequired" in squashed
+                and "partno" in squashed
+                and "partdescription" in squashed
+                and "taskcode" in squashed
+                and "taskaction" in squashed
+            ):
+                return LineKind.SPARES_HEADER
+            if "taskcode" in squashed and "taskaction" in squashed:
+                return LineKind.HEADER
+
+        if low.startswith(_META_PREFIXES) or "tetra pak internal" in low:
+            return LineKind.METADATA
+
+        if "\\" in line or "[" in line:
+            return LineKind.COMPONENT
 
+    tokens = strip_status_prefix(line).split()
+    if (
+        len(tokens) >= 3
+        and "/" not in tokens[0]
+        and _is_task_code_token(tokens[0])
+        and tokens[1].isalpha()
+        and tokens[1].isupper()
+    ):
+        return LineKind.TASK
 
-def is_metadata_line(line: str) -> bool:
-    """
-    Filter out page/meta lines.
-    """
-    low = line.lower().strip()
-    return (
-        low.startswith("database:")
-        or low.startswith("printed by")
-        or low.startswith("page ")
-        or "tetra pak internal" in low  # footer
-    )
+    return LineKind.OTHER
 
 
+# ----------------------------------------------------------------------
+# Helpers & heuristics
+# ----------------------------------------------------------------------
 def parse_asset_line(line: str) -> Tuple[str, str]:
     """
     'Asset: 9000171371 TP A3/F-040V ...' → (asset_code, asset_type_string)
@@ -93,27 +331,20 @@ def parse_asset_line(line: str) -> Tuple[str, str]:
     return asset_code, asset_type
 
 
-def looks_like_component_line(line: str) -> bool:
+def _last_paren_digits(s: str) -> str:
     """
-    Grey rows with component / location info:
-    e.g. '1 Pre-Maintenance Checks: (9000171371) ... \ [648575-0400] ...'
-
-    IMPORTANT: do NOT treat spare-part rows (which start with '1234567-0000')
-    as component rows.
+    Return the digits of the last '(1234)' group in s, scanning from the
+    right so earlier groups are never materialized.
     """
-    stripped = line.strip()
-    if not stripped:
-        return False
-
-    # Spare-part rows start with a part number like '1036615-0000'
-    if re.match(r"^\d{5,}-\d{3,}\b", stripped):
-        return False
-
-    if "\\" in line or "[" in line or stripped.startswith("("):
-        return True
-    if re.match(r"^\(\d{6,}-\d{4,}:", stripped):
-        return True
-    return False
+    i = len(s)
+    while True:
+        lp = s.rfind("(", 0, i)
+        if lp < 0:
+            return ""
+        rp = s.find(")", lp + 1)
+        if rp > lp + 1 and s[lp + 1 : rp].isdigit():
+            return s[lp + 1 : rp]
+        i = lp
 
 
 def parse_grey_row(line: str):
@@ -125,81 +356,165 @@ def parse_grey_row(line: str):
     - ComponentPath (full raw line)
     """
     component_path = line.strip()
-    if "\\" in line:
-        a, b = line.split("\\", 1)
+    # find + slicing: one scan, no intermediate list from split.
+    bs = line.find("\\")
+    if bs >= 0:
+        a, b = line[:bs], line[bs + 1:]
     else:
         a, b = line, ""
-    location1 = a.strip()
-    location2 = b.strip()
-    codes = re.findall(r"\((\d+)\)", line)
-    set_type_code = codes[-1] if codes else ""
+    # Interned: the same location/context strings repeat across many rows.
+    location1 = sys.intern(a.strip())
+    location2 = sys.intern(b.strip())
+    code = _last_paren_digits(line)
+    set_type_code = sys.intern(code) if code else ""
     return location1, location2, set_type_code, component_path
 
 
-def strip_status_prefix(line: str) -> str:
+def _is_task_code_token(tok: str) -> bool:
     """
-    Remove bullets / markers before the first digit or '*'.
+    Optional leading '*', then 6-8 digits — str.isdigit is a single C
+    loop, far cheaper than the regex engine for per-token tests.
     """
-    m = re.search(r"[\*\d]", line)
-    return line[m.start():].strip() if m else line.strip()
+    s = tok[1:] if tok.startswith("*") else tok
+    return 6 <= len(s) <= 8 and s.isdigit()
 
 
-def looks_like_task_row(line: str) -> bool:
+def _is_part_number_token(tok: str) -> bool:
     """
-    Detect rows that begin a Task:
-    '*9465150 ENGR Check Check ...'
+    '1234567-0000' style: 5+ digits, a hyphen, 3+ digits.
     """
-    if is_metadata_line(line):
-        return False
-    if looks_like_component_line(line) and " " not in strip_status_prefix(line).split()[0]:
-        return False
+    head, sep, tail = tok.partition("-")
+    return bool(sep) and len(head) >= 5 and len(tail) >= 3 and head.isdigit() and tail.isdigit()
 
-    tokens = strip_status_prefix(line).split()
-    if len(tokens) < 3:
-        return False
-
-    code_token = tokens[0]
-    if "/" in code_token:
-        return False
 
-    if not re.match(r"\*?\d{6,8}$", code_token):
-        return False
-
-    trade_token = tokens[1]
-    return trade_token.isalpha() and trade_token.isupper()
+def strip_status_prefix(line: str) -> str:
+    """
+    Remove bullets / markers before the first digit or '*'.
+    """
+    m = _RE_STATUS.search(line)
+    return line[m.start():].strip() if m else line.strip()
 
 
 def normalize_task_code(code: str) -> str:
     """
     Remove leading '*' for consistent lookup.
     """
-    return re.sub(r"^\*", "", code)
-
-
-def gather_task_block(lines: List[str], idx: int) -> Tuple[str, int]:
-    """
-    Given index of a line that starts a task, gather continuation lines
-    until we hit a new task / component / asset / header / metadata.
+    return _RE_LEADING_STAR.sub("", code)
+
+
+# Kinds that end a multi-line block. Task blocks run until any other
+# structured line; part blocks additionally swallow stray header,
+# component and task lines (matching the old predicate-based lookahead,
+# which only stopped parts on spares headers, metadata, assets and the
+# next part number).
+_TASK_STOP_KINDS = frozenset((
+    LineKind.ASSET,
+    LineKind.HEADER,
+    LineKind.SPARES_HEADER,
+    LineKind.METADATA,
+    LineKind.COMPONENT,
+    LineKind.TASK,
+))
+_PART_STOP_KINDS = frozenset((
+    LineKind.ASSET,
+    LineKind.SPARES_HEADER,
+    LineKind.METADATA,
+    LineKind.PART,
+))
+
+
+def gather_block(
+    lines: List[str], kinds: List[LineKind], idx: int, stop_kinds: frozenset
+) -> Tuple[str, int]:
+    """
+    Gather the block starting at lines[idx] plus its continuation lines,
+    stopping at the first line whose precomputed kind is in stop_kinds.
     Returns (combined_text, next_index).
+
+    The lookahead is a pure array walk: every line was classified once
+    up front, so no predicate re-runs here or when the scan loop later
+    lands on the stopping line.
     """
     buf = [lines[idx]]
     i = idx + 1
     n = len(lines)
 
     while i < n:
-        ln = lines[i]
-        if not ln.strip():
-            i += 1
-            continue
-        if is_metadata_line(ln) or is_header_line(ln):
-            break
-        if looks_like_task_row(ln) or looks_like_component_line(ln) or ln.lower().startswith("asset:"):
+        if kinds[i] in stop_kinds:
             break
-        buf.append(ln)
+        ln = lines[i]
+        if ln.strip():
+            buf.append(ln)
         i += 1
 
     return " ".join(buf), i
 
+_INTERVAL_UNITS = frozenset(
+    ("hour", "hours", "week", "weeks", "month", "months", "day", "days")
+)
+
+
+def _is_interval_number(tok: str) -> bool:
+    """
+    '1000' or '2.5' — digits with at most one interior dot.
+    """
+    return (
+        bool(tok)
+        and tok[0].isdigit()
+        and tok[-1].isdigit()
+        and tok.replace(".", "", 1).isdigit()
+    )
+
+
+def _split_interval(body: List[str]) -> Tuple[List[str], str]:
+    """
+    Pop a trailing interval ('No Interval' / '1000 Hours') off the token
+    list. Returns (remaining_tokens, interval).
+    """
+    if len(body) >= 2:
+        # '1000 Hours' is the dominant ending; try it first and lowercase
+        # the final token only once.
+        last = body[-1].lower()
+        if last in _INTERVAL_UNITS and _is_interval_number(body[-2]):
+            return body[:-2], f"{body[-2]} {body[-1]}"
+        if last == "interval" and body[-2].lower() == "no":
+            return body[:-2], "No Interval"
+    return body, ""
+
+
+def _split_doc_ref_and_desc(body: List[str]) -> Tuple[str, str]:
+    """
+    Split the remaining tokens into (description, doc_ref).
+
+    'No reference' anywhere wins (tokens after it are discarded);
+    otherwise a trailing short code like 'MM' or '4.2.5.1-3' is the
+    DocRef and the rest is description.
+    """
+    for j in range(len(body) - 1):
+        tok = body[j]
+        # One-char gate: almost no tokens start with N/n, so the two
+        # lower() allocations below are skipped for nearly every token.
+        if tok[0] in "Nn" and tok.lower() == "no" and body[j + 1].lower() == "reference":
+            return " ".join(body[:j]).strip(), "No reference"
+
+    if body and _is_allowed_docref(body[-1]):
+        return " ".join(body[:-1]).strip(), body[-1]
+
+    return " ".join(body).strip(), ""
+
+
+def _is_allowed_docref(tok: str) -> bool:
+    if "/" in tok:
+        return False  # serial-like, keep in description
+    # Short all-caps code like 'MM'
+    if 2 <= len(tok) <= 8 and tok.isascii() and tok.isalpha() and tok.isupper():
+        return True
+    # Dotted numeric reference like '4.2.5.1-3'
+    if _RE_NUMERIC_DOCREF.fullmatch(tok):
+        return True
+    return False
+
+
 def parse_task_row(full_line: str):
     """
     Parse a full task row (possibly assembled from multiple lines).
@@ -216,108 +531,30 @@ def parse_task_row(full_line: str):
     task_code, trade, task_action = tokens[0], tokens[1], tokens[2]
     rest = " ".join(tokens[3:]).strip()
 
-    # Normalize missing space before "No Interval" (e.g., "...00361No Interval")
-    rest = re.sub(r"(?i)(?<!\s)(no\s+interval)", r" \1", rest)
-    # Normalize missing space between serials and DocRef (e.g., "...00327" + "4.2.5.1-3")
-    rest = re.sub(r"([0-9]/[0-9]{3,})(\d+\.\d+.*-\d+)", r"\1 \2", rest)
-
-    # --- Interval extraction (at the very end) ---
-    interval = ""
-    m_no = re.search(r"(?i)\bno\s+interval\s*$", rest)
-    if m_no:
-        interval = "No Interval"
-        rest = rest[: m_no.start()].rstrip()
-    else:
-        m_int = re.search(
-            r"(\d+(?:\.\d+)?)\s+(Hours?|Weeks?|Months?|Days?)\s*$",
-            rest,
-            flags=re.IGNORECASE,
-        )
-        if m_int:
-            interval = f"{m_int.group(1)} {m_int.group(2)}"
-            rest = rest[: m_int.start()].rstrip()
-
-    # --- DocRef: special case 'No reference' anywhere before the interval ---
-    doc_ref = ""
-    m_doc_no = re.search(r"(?i)\bno\s+reference\b", rest)
-    if m_doc_no:
-        # Everything before 'No reference' is description
-        doc_ref = "No reference"
-        rest = rest[: m_doc_no.start()].rstrip()
+    # Repair missing spaces before "No Interval" (e.g. "...00361No Interval")
+    # and between serials and DocRef (e.g. "...00327" + "4.2.5.1-3") in a
+    # single pass.
+    rest = _RE_MISSING_SPACE.sub(_fix_missing_space, rest)
 
     body = rest.split()
 
+    # --- Interval extraction (at the very end) ---
+    body, interval = _split_interval(body)
+
     if not body:
         # No description text left
-        return task_code, trade, task_action, "", doc_ref, interval
-
-    # If we already know DocRef is 'No reference', all remaining tokens are description
-    if doc_ref:
-        desc = " ".join(body).strip()
-        return task_code, trade, task_action, desc, doc_ref, interval
-
-    # Otherwise, we may have a short code DocRef like 'MM' or '4.2.5.1-3' at the end
-    def is_allowed_docref(tok: str) -> bool:
-        if "/" in tok:
-            return False  # serial-like, keep in description
-        if re.fullmatch(r"[A-Z]{2,8}", tok):
-            return True
-        if re.fullmatch(r"\d+(?:\.\d+)*-\d+", tok):
-            return True
-        return False
-
-    if body and is_allowed_docref(body[-1]):
-        desc_tokens = body[:-1]
-        doc_ref = body[-1]
-        desc = " ".join(desc_tokens).strip()
-        return task_code, trade, task_action, desc, doc_ref, interval
-
-    # Fallback: everything is description, DocRef empty
-    desc = " ".join(body).strip()
-    return task_code, trade, task_action, desc, "", interval
-
+        return task_code, trade, task_action, "", "", interval
 
+    desc, doc_ref = _split_doc_ref_and_desc(body)
+    return task_code, trade, task_action, desc, doc_ref, interval
 
 
-def looks_like_part_line(line: str) -> bool:
-    """
-    Detect a spare part row by the '1234567-0000' style part number.
-    """
-    return bool(re.match(r"^\d{5,}-\d{3,}\b", line.strip()))
-
-
-def gather_part_block(lines: List[str], idx: int) -> Tuple[str, int]:
-    """
-    Gather one spare part record that may span multiple lines.
-    """
-    buf = [lines[idx]]
-    i = idx + 1
-    n = len(lines)
-
-    while i < n:
-        nxt = lines[i]
-        if not nxt.strip():
-            i += 1
-            continue
-        if is_spares_header_line(nxt) or is_metadata_line(nxt):
-            break
-        low = nxt.lower().strip()
-        if low.startswith("asset:") or low.startswith("spares asset:"):
-            break
-        if looks_like_part_line(nxt) and i != idx:
-            break
-        buf.append(nxt)
-        i += 1
-
-    return " ".join(buf), i
-
-
-def parse_part_block(lines: List[str], idx: int):
+def parse_part_block(lines: List[str], kinds: List[LineKind], idx: int):
     """
     Parse one spare part block starting at lines[idx].
     Returns (dict_or_None, next_index).
     """
-    combined, next_idx = gather_part_block(lines, idx)
+    combined, next_idx = gather_block(lines, kinds, idx, _PART_STOP_KINDS)
     if not combined.strip():
         return None, next_idx
 
@@ -326,14 +563,14 @@ def parse_part_block(lines: List[str], idx: int):
         return None, next_idx
 
     # Part number
-    if not re.fullmatch(r"\d{5,}-\d{3,}", tokens[0]):
+    if not _is_part_number_token(tokens[0]):
         return None, next_idx
     part_no = tokens[0]
 
     # Task code
     task_idx = None
     for j in range(1, len(tokens)):
-        if re.fullmatch(r"\*?\d{6,8}", tokens[j]):
+        if _is_task_code_token(tokens[j]):
             task_idx = j
             break
 
@@ -347,14 +584,15 @@ def parse_part_block(lines: List[str], idx: int):
     qty = ""
 
     if comp_tokens:
+        # Unit of measure: short alphabetic token like 'pcs' or 'M'.
         last = comp_tokens[-1]
-        if re.fullmatch(r"[A-Za-z]{1,4}", last):
+        if len(last) <= 4 and last.isascii() and last.isalpha():
             uom = last
             comp_tokens = comp_tokens[:-1]
 
     if comp_tokens:
         last = comp_tokens[-1]
-        if re.fullmatch(r"[0-9]+(?:\.[0-9]+)?", last):
+        if _is_interval_number(last):
             qty = last
             comp_tokens = comp_tokens[:-1]
 
@@ -378,18 +616,25 @@ def parse_part_block(lines: List[str], idx: int):
 # ----------------------------------------------------------------------
 # Extraction logic
 # ----------------------------------------------------------------------
-def extract_tasks(pdf_path: Path):
+def extract_all(pdf_path: Path):
     """
-    Extract all tasks from the whole PDF.
-    Returns:
-        task_rows: list of row dicts for Tasks sheet
-        task_lookup: dict TaskCode -> row dict
-        asset_type, asset_code, lines (for spares)
+    Extract tasks and spare parts from the whole PDF in a single line-scan.
+
+    Task rows and spare-part rows share one walk over the lines, so each
+    line is classified exactly once instead of once per pass. Spare rows
+    keep their own component/location context, which resets at every
+    spares header (same semantics as the old dedicated spares pass).
+
+    Returns (task_rows, spare_rows).
     """
     lines = pdf_to_text_lines(pdf_path)
+    # Classify every line up front; the scan loop (and any lookahead)
+    # reads the precomputed tag instead of re-deriving it.
+    kinds = [classify(ln) for ln in lines]
 
-    rows = []
-    rows_by_code: Dict[str, Dict] = {}
+    # Insertion-ordered: dicts preserve first-seen order, so this is both
+    # the dedup index and the final row order.
+    rows_by_code: Dict[str, TaskRow] = {}
     current_loc1 = ""
     current_loc2 = ""
     current_setcode = ""
@@ -397,258 +642,196 @@ def extract_tasks(pdf_path: Path):
     asset_type = ""
     asset_code = ""
 
-    i = 0
-    n = len(lines)
+    # Spares state: parts are only collected after a spares header, with
+    # a separate location context that resets at each header.
+    in_spares = False
+    spare_loc1 = ""
+    spare_loc2 = ""
+    spare_setcode = ""
+    pending_spares = []  # (parsed_part, spare_loc1, spare_loc2, spare_setcode)
+    seen_keys = set()
 
-    while i < n:
+    # Headers, metadata and free text never mutate state; walk only the
+    # indices that do. This shrinks the dispatch loop from N lines to
+    # the number of asset/header/component/task/part rows.
+    events = [
+        i
+        for i, kind in enumerate(kinds)
+        if kind not in (LineKind.OTHER, LineKind.HEADER, LineKind.METADATA)
+    ]
+
+    # End of the most recent gathered part block. The old architecture
+    # ran the task and spares passes over the same lines independently:
+    # a part-block gather hid lines from the spares pass only, so task
+    # and component events inside the range still dispatch here — the
+    # watermark merely suppresses their spare-side effects. Task-block
+    # gathers likewise hide nothing from the spares side (the old task
+    # pass folded part lines into task text while the spares pass still
+    # parsed them), so they set no watermark at all.
+    part_block_until = 0
+
+    for i in events:
         ln = lines[i]
-        low = ln.lower()
+        kind = kinds[i]
+        in_part_block = i < part_block_until
 
-        if low.startswith("asset:"):
+        if kind is LineKind.ASSET:
             asset_code, asset_type = parse_asset_line(ln)
-            i += 1
             continue
 
-        if is_header_line(ln):
-            i += 1
+        if kind is LineKind.SPARES_HEADER:
+            in_spares = True
+            spare_loc1 = ""
+            spare_loc2 = ""
+            spare_setcode = ""
             continue
 
-        if is_metadata_line(ln):
-            i += 1
-            continue
-
-        if looks_like_component_line(ln):
-            current_loc1, current_loc2, current_setcode, current_comppath = parse_grey_row(ln)
-            i += 1
-            continue
-
-        if looks_like_task_row(ln):
-            block, next_i = gather_task_block(lines, i)
-            task_code, trade, action, desc, doc_ref, interval = parse_task_row(block)
-            norm = normalize_task_code(task_code)
-
-            row = {
-                "TaskCode": norm,
-                "Trade": trade,
-                "TaskAction": action,
-                "TaskDescription": desc,
-                "DocRef": doc_ref,
-                "Interval": interval,
-                "Location1": current_loc1,
-                "Location2": current_loc2,
-                "setTypeCode": current_setcode,
-                "ComponentPath": current_comppath,
-                # Extra columns (blank or defaults)
-                "TypeOfWork": "",
-                "MotionType": "",
-                "Duration": "",
-                "DurationCalc": "",
-                "DurationUOM": "",
-                "MTBMPredicted": "",
-                "CostCode": "",
-                "IncludeInME": "",
-                "TaskDependency": "",
-                "FollowUpTasks": "",
-                "LocationDependency": "",
-                "Active": "Y",
-                "Section": "",
-                "AssetType": asset_type,
-                "AssetTypeCode": current_setcode or asset_code,
-            }
-
-            if norm in rows_by_code:
-                existing = rows_by_code[norm]
-                # merge: prefer longer description, fill missing fields
-                if len(desc) > len(existing.get("TaskDescription", "")):
-                    existing["TaskDescription"] = desc
-                if not existing.get("DocRef") and doc_ref:
-                    existing["DocRef"] = doc_ref
-                if not existing.get("Interval") and interval:
-                    existing["Interval"] = interval
-                if not existing.get("Location1") and current_loc1:
-                    existing["Location1"] = current_loc1
-                if not existing.get("Location2") and current_loc2:
-                    existing["Location2"] = current_loc2
-            else:
-                rows.append(row)
-                rows_by_code[norm] = row
-
-            i = next_i
-            continue
-
-        i += 1
-
-    return rows, rows_by_code, asset_type, asset_code, lines
-
-
-def extract_spares_from_lines(lines: List[str], task_lookup: Dict[str, Dict]):
-    """
-    Extract all spare parts from the lines, associating them with the task
-    context (TaskCode, locations, setTypeCode) whenever possible.
-    """
-    spare_rows = []
-    seen_keys = set()
-
-    # Find all spares header indices
-    header_indices = [i for i, ln in enumerate(lines) if is_spares_header_line(ln)]
-    if not header_indices:
-        return spare_rows
-
-    for idx, header_idx in enumerate(header_indices):
-        end = header_indices[idx + 1] if idx + 1 < len(header_indices) else len(lines)
-
-        current_loc1 = ""
-        current_loc2 = ""
-        current_setcode = ""
-        current_comppath = ""
-
-        i = header_idx + 1
-        while i < end:
-            ln = lines[i]
-
-            if not ln.strip():
-                i += 1
+        if kind is LineKind.PART:
+            if not in_spares or in_part_block:
                 continue
 
-            low = ln.lower()
-            if is_metadata_line(ln) or low.startswith("asset:") or low.startswith("spares asset:"):
-                i += 1
+            parsed, next_i = parse_part_block(lines, kinds, i)
+            part_block_until = next_i
+            if not parsed or not parsed.get("TaskCode"):
                 continue
 
-            if is_spares_header_line(ln):
-                i += 1
+            # Single-string key: one allocation and one hash instead of
+            # a tuple plus three element hashes. \x1f never appears in
+            # extracted text, so the join is unambiguous.
+            key = f"{parsed['TaskCode']}\x1f{parsed['PartNo']}\x1f{parsed['PartDescription']}"
+            if key in seen_keys:
                 continue
+            seen_keys.add(key)
 
-            # IMPORTANT: detect spare part rows BEFORE treating anything as a component line
-            if looks_like_part_line(ln):
-                parsed, next_i = parse_part_block(lines, i)
-                i = next_i
-                if not parsed:
-                    continue
+            pending_spares.append((parsed, spare_loc1, spare_loc2, spare_setcode))
+            continue
 
-                task_code = parsed.get("TaskCode")
-                if not task_code:
-                    continue
+        if kind is LineKind.COMPONENT:
+            current_loc1, current_loc2, current_setcode, current_comppath = parse_grey_row(ln)
+            # Grey rows swallowed by a part-block gather were invisible
+            # to the old spares pass, so they update the task context
+            # only.
+            if in_spares and not in_part_block:
+                spare_loc1, spare_loc2, spare_setcode = current_loc1, current_loc2, current_setcode
+            continue
 
-                task_ctx = task_lookup.get(task_code, {})
-                key = (task_code, parsed["PartNo"], parsed["PartDescription"])
-                if key in seen_keys:
-                    continue
-                seen_keys.add(key)
-
-                loc1 = current_loc1 or task_ctx.get("Location1", "")
-                loc2 = current_loc2 or task_ctx.get("Location2", "")
-                setcode = current_setcode or task_ctx.get("setTypeCode", "")
-                if not setcode:
-                    matches = re.findall(r"\((\d+)\)", parsed.get("ComponentPath", ""))
-                    if matches:
-                        setcode = matches[-1]
-
-                spare_rows.append(
-                    {
-                        "TaskCode": task_code,
-                        "PartNo": parsed["PartNo"],
-                        "PartDescription": parsed["PartDescription"],
-                        "MU_TL": "",
-                        "QtyRequired": parsed["QtyRequired"],
-                        "UOM": parsed["UOM"],
-                        "ItemDependency": "",
-                        "Location1": loc1,
-                        "Location2": loc2,
-                        "AssetType": "",
-                        "AssetTypeCode": setcode,
-                    }
+        if kind is LineKind.TASK:
+            block, _ = gather_block(lines, kinds, i, _TASK_STOP_KINDS)
+            task_code, trade, action, desc, doc_ref, interval = parse_task_row(block)
+            norm = sys.intern(normalize_task_code(task_code))
+
+            existing = rows_by_code.get(norm)
+            if existing is not None:
+                # merge: prefer longer description, fill missing fields.
+                # Most duplicates have nothing left to fill, so check
+                # that once instead of testing field by field.
+                has_missing = not (
+                    existing.DocRef
+                    and existing.Interval
+                    and existing.Location1
+                    and existing.Location2
                 )
-                continue
-
-            # Only component / location context lines reach here
-            if looks_like_component_line(ln):
-                current_loc1, current_loc2, current_setcode, current_comppath = parse_grey_row(ln)
-                i += 1
-                continue
+                if has_missing or len(desc) > len(existing.TaskDescription):
+                    if len(desc) > len(existing.TaskDescription):
+                        existing.TaskDescription = desc
+                    if not existing.DocRef and doc_ref:
+                        existing.DocRef = doc_ref
+                    if not existing.Interval and interval:
+                        existing.Interval = interval
+                    if not existing.Location1 and current_loc1:
+                        existing.Location1 = current_loc1
+                    if not existing.Location2 and current_loc2:
+                        existing.Location2 = current_loc2
+            else:
+                rows_by_code[norm] = TaskRow(
+                    TaskCode=norm,
+                    Trade=trade,
+                    TaskAction=action,
+                    TaskDescription=desc,
+                    DocRef=doc_ref,
+                    Interval=interval,
+                    Location1=current_loc1,
+                    Location2=current_loc2,
+                    setTypeCode=current_setcode,
+                    ComponentPath=current_comppath,
+                    AssetType=asset_type,
+                    AssetTypeCode=current_setcode or asset_code,
+                )
+            continue
 
-            i += 1
+    # Resolve spare-row context after the scan so the task lookup is
+    # complete, matching the old two-pass fallback semantics.
+    spare_rows = []
+    # Consecutive part rows usually share a task code, so remember the
+    # last lookup instead of hashing into rows_by_code every row.
+    last_code = None
+    task_ctx = None
+    for parsed, loc1, loc2, setcode in pending_spares:
+        task_code = parsed["TaskCode"]
+        if task_code != last_code:
+            last_code = task_code
+            task_ctx = rows_by_code.get(task_code)
+
+        if task_ctx is not None:
+            loc1 = loc1 or task_ctx.Location1
+            loc2 = loc2 or task_ctx.Location2
+            setcode = setcode or task_ctx.setTypeCode
+        if not setcode:
+            setcode = _last_paren_digits(parsed.get("ComponentPath", ""))
+
+        spare_rows.append(
+            SpareRow(
+                TaskCode=task_code,
+                PartNo=parsed["PartNo"],
+                PartDescription=parsed["PartDescription"],
+                QtyRequired=parsed["QtyRequired"],
+                UOM=parsed["UOM"],
+                Location1=loc1,
+                Location2=loc2,
+                AssetTypeCode=setcode,
+            )
+        )
 
-    return spare_rows
+    return list(rows_by_code.values()), spare_rows
 
 
 # ----------------------------------------------------------------------
 # Workbook builder
 # ----------------------------------------------------------------------
-def build_workbook(task_rows: List[Dict], spare_rows: List[Dict]) -> Workbook:
-    wb = Workbook()
+def write_workbook(task_rows: List[TaskRow], spare_rows: List[SpareRow], output_xlsx: Path) -> None:
+    """
+    Write the Tasks and SpareParts sheets straight to disk with
+    XlsxWriter. constant_memory streams each row as it is written, and
+    each row tuple is built and handed over one at a time, so nothing
+    cell-shaped or row-shaped accumulates in the writer.
+    """
+    wb = xlsxwriter.Workbook(
+        str(output_xlsx),
+        {
+            "constant_memory": True,
+            # Cell text is written verbatim; skipping the formula/URL
+            # sniffing saves a scan of every string cell.
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        },
+    )
+    bold = wb.add_format({"bold": True})
 
     # --- Tasks sheet ---
-    ws_tasks = wb.active
-    ws_tasks.title = "Tasks"
-    ws_tasks.delete_rows(1, ws_tasks.max_row)
-
-    task_headers = [
-        "Sort",
-        "TaskCode",
-        "TaskAction",
-        "TaskDescription",
-        "TypeOfWork",
-        "MotionType",
-        "Duration",
-        "DurationCalc",
-        "DurationUOM",
-        "Interval",
-        "MTBMPredicted",
-        "CostCode",
-        "IncludeInME",
-        "TaskDependency",
-        "FollowUpTasks",
-        "LocationDependency",
-        "Active",
-        "Trade",
-        "Section",
-        "DocRef",
-        "Location1",
-        "Location2",
-        "ComponentPath",
-        "AssetType",
-        "AssetTypeCode",
-    ]
-
-    ws_tasks.append(task_headers)
-    for cell in ws_tasks[1]:
-        bold_font = copy(cell.font)
-        bold_font.bold = True
-        cell.font = bold_font
-    ws_tasks.row_dimensions[1].height = 22
+    ws_tasks = wb.add_worksheet("Tasks")
+    ws_tasks.write_row(0, 0, TASK_HEADERS, bold)
 
     for idx, row in enumerate(task_rows, start=1):
-        row["Sort"] = idx
-        ws_tasks.append([row.get(h, "") for h in task_headers])
+        ws_tasks.write_row(idx, 0, (idx,) + _TASK_FIELDS(row))
 
     # --- SpareParts sheet ---
-    ws_spares = wb.create_sheet("SpareParts")
-    spare_headers = [
-        "TaskCode",
-        "PartNo",
-        "PartDescription",
-        "MU_TL",
-        "QtyRequired",
-        "UOM",
-        "ItemDependency",
-        "Location1",
-        "Location2",
-        "AssetType",
-        "AssetTypeCode",
-    ]
-
-    ws_spares.append(spare_headers)
-    for cell in ws_spares[1]:
-        bold_font = copy(cell.font)
-        bold_font.bold = True
-        cell.font = bold_font
-    ws_spares.row_dimensions[1].height = 22
+    ws_spares = wb.add_worksheet("SpareParts")
+    ws_spares.write_row(0, 0, SPARE_HEADERS, bold)
 
-    for row in spare_rows:
-        ws_spares.append([row.get(h, "") for h in spare_headers])
+    for idx, row in enumerate(spare_rows, start=1):
+        ws_spares.write_row(idx, 0, _SPARE_FIELDS(row))
 
-    return wb
+    wb.close()
 
 
 # ----------------------------------------------------------------------
@@ -677,13 +860,11 @@ def main():
         output_xlsx = pdf_path.with_name(f"{pdf_path.stem}_tasks_spares.xlsx")
 
     print(f"Reading PDF: {pdf_path}")
-    task_rows, task_lookup, asset_type, asset_code, lines = extract_tasks(pdf_path)
+    task_rows, spare_rows = extract_all(pdf_path)
     print(f"Extracted {len(task_rows)} task rows.")
-    spare_rows = extract_spares_from_lines(lines, task_lookup)
     print(f"Extracted {len(spare_rows)} spare part rows.")
 
-    wb = build_workbook(task_rows, spare_rows)
-    wb.save(output_xlsx)
+    write_workbook(task_rows, spare_rows, output_xlsx)
     print(f"Saved Excel file: {output_xlsx}")
 
 